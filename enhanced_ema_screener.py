@@ -17,16 +17,139 @@ import os
 import time
 import csv
 import json
+import threading
+import asyncio
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from datetime import datetime, timedelta, time as dtime
+from contextlib import contextmanager
+from functools import wraps
+from io import BytesIO
 import logging
 from tqdm import tqdm
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+# NSE closes at 15:30; the day's closing prices are fetched after this
+MARKET_CLOSE = dtime(15, 30)
+
+try:
+    from numba import jit, prange
+except ImportError:
+    def jit(*args, **kwargs):
+        """Fallback when numba is not installed - kernels run as plain Python"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+    
+    prange = range
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+@jit(nopython=True, nogil=True, cache=True, fastmath=True)
+def _ema_triple(prices, alphas):
+    """Final 50/100/200 EMA values from a single pass over the prices
+    
+    Seeded with the first price and updated as e += alpha * (p - e), so each value equals
+    Series.ewm(span=period, adjust=False).mean().iloc[-1] - one multiply-add per step,
+    no adjust=True weight normalisation. State stays in the prices' dtype (float32 for
+    the Parquet store) when alphas match it.
+    """
+    return _ema_advance(prices[1:], alphas, prices[0], prices[0], prices[0])
+
+@jit(nopython=True, nogil=True, cache=True, fastmath=True)
+def _ema_advance(prices, alphas, e0, e1, e2):
+    """Continue three EMA states (e0, e1, e2) over further prices"""
+    a0 = alphas[0]
+    a1 = alphas[1]
+    a2 = alphas[2]
+    
+    for i in range(prices.shape[0]):
+        p = prices[i]
+        e0 += a0 * (p - e0)
+        e1 += a1 * (p - e1)
+        e2 += a2 * (p - e2)
+    
+    return e0, e1, e2
+
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def _ema_triple_batch(prices, lengths, alphas):
+    """EMAs and last close for every row of a padded (n_stocks, max_len) price block"""
+    n_stocks = prices.shape[0]
+    out = np.empty((n_stocks, 4))
+    
+    for s in prange(n_stocks):
+        n = lengths[s]
+        e0, e1, e2 = _ema_triple(prices[s, :n], alphas)
+        out[s, 0] = e0
+        out[s, 1] = e1
+        out[s, 2] = e2
+        out[s, 3] = prices[s, n - 1]
+    
+    return out
+
+@contextmanager
+def update_file_lock(path):
+    """Hold an exclusive lock on path, shared with every other process that locks it"""
+    with open(path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after about 10 seconds; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def holds_update_lock(method):
+    """Run a screener method under its update file lock"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with update_file_lock(self.update_lock_file):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class RateLimiter:
+    """Token bucket capping how many requests are started per second across download tasks"""
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
 class EnhancedEMAScreener:
     def __init__(self):
         # Configuration
@@ -44,9 +167,14 @@ class EnhancedEMAScreener:
         self.cache_dir.mkdir(exist_ok=True)
         
         # Files
-        self.ema_cache_file = self.cache_dir / "enhanced_ema_cache.csv"
+        self.data_file = self.data_dir / "prices.parquet"  # dataset partitioned by symbol
+        self.ema_cache_file = self.cache_dir / "enhanced_ema_cache.parquet"
+        self.legacy_ema_cache_file = self.cache_dir / "enhanced_ema_cache.csv"
         self.progress_file = self.cache_dir / "download_progress.json"
         self.last_update_file = self.cache_dir / "last_update.json"
+        # Setup and daily updates write the same price store and EMA cache, so they hold this
+        # lock - it covers the webapp's workers and the startup check process alike
+        self.update_lock_file = self.cache_dir / "update.lock"
         
         # HTTP headers
         self.headers = {
@@ -61,17 +189,30 @@ class EnhancedEMAScreener:
         # Constants
         self.rate_limit_delay = 3
         self.max_retries = 3
-        self.session_refresh_interval = 15
+        self.pool_size = 20
+        self.max_update_files = 20  # daily files per symbol before they are compacted
+        self.download_workers = 8  # downloads in flight at once
+        self.connection_limit = 16
+        self.requests_per_second = 2
         
         # EMA periods
         self.ema_periods = [50, 100, 200]
+        # Smoothing factors for the EMA kernels, float32 to match the stored prices
+        self._alphas = np.array([2.0 / (p + 1) for p in self.ema_periods], dtype=np.float32)
         
         # Setup logging
         self.setup_logging()
         
-        # Session
+        # Session (kept for the lifetime of the screener, refreshed only when NSE rejects it)
         self.session = None
-        self.request_count = 0
+        self.session_lock = threading.Lock()
+        self.rate_limiter = RateLimiter(self.requests_per_second)
+        
+        # EMA cache records waiting to be written by flush_ema_cache
+        self._ema_records = {}
+        
+        # Loaded price histories keyed by symbol, valid while the files' mtimes match
+        self._df_cache = {}
         
     def setup_logging(self):
         """Setup comprehensive logging"""
@@ -94,6 +235,12 @@ class EnhancedEMAScreener:
         session = requests.Session()
         session.headers.update(self.headers)
         
+        # Pooled keep-alive connections; transient failures are retried with backoff
+        retry = Retry(total=self.max_retries, backoff_factor=1,
+                      status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount('https://', adapter)
+        
         try:
             response = session.get(self.nse_main_url, timeout=10)
             self.logger.info("Session created successfully")
@@ -103,21 +250,28 @@ class EnhancedEMAScreener:
             return None
     
     def refresh_session_if_needed(self):
-        """Refresh session periodically"""
-        if self.session is None or self.request_count >= self.session_refresh_interval:
-            self.logger.info("Refreshing session...")
-            self.session = self.get_session()
-            self.request_count = 0
-            time.sleep(2)
+        """Create the session if there is none or NSE rejected the last one"""
+        with self.session_lock:
+            if self.session is None:
+                self.logger.info("Refreshing session...")
+                self.session = self.get_session()
+                time.sleep(2)
+            return self.session
+    
+    def invalidate_session(self, session):
+        """Drop a session NSE rejected, unless another caller already replaced it"""
+        with self.session_lock:
+            if self.session is session:
+                self.session = None
     
     def read_nifty_symbols(self):
         """Read all symbols from NIFTY Total Market CSV"""
         try:
             self.logger.info(f"Reading symbols from {self.nifty_csv}")
-            df = pd.read_csv(self.nifty_csv)
+            table = pacsv.read_csv(self.nifty_csv, convert_options=pacsv.ConvertOptions(include_columns=['SYMBOL']))
             
             symbols = []
-            for symbol in df['SYMBOL'].tolist():
+            for symbol in table.column('SYMBOL').to_pylist():
                 if symbol and symbol != 'NIFTY TOTAL MARKET':
                     symbols.append(symbol.strip('"'))
             
@@ -127,30 +281,37 @@ class EnhancedEMAScreener:
             self.logger.error(f"Error reading symbols: {e}")
             return []
     
-    def calculate_ema(self, prices, period):
-        """Calculate Exponential Moving Average"""
-        if len(prices) < period:
-            return None
-        
-        prices = np.array(prices, dtype=float)
-        alpha = 2 / (period + 1)
-        ema = np.zeros_like(prices)
-        ema[0] = prices[0]
-        
-        for i in range(1, len(prices)):
-            ema[i] = alpha * prices[i] + (1 - alpha) * ema[i - 1]
-        
-        return ema[-1]
-    
     def calculate_multiple_emas(self, prices):
         """Calculate 50, 100, 200 day EMAs"""
+        prices = np.ascontiguousarray(prices, dtype=np.float32)
+        
+        # All three EMAs are updated together in one pass over the prices
+        values = _ema_triple(prices, self._alphas)
+        
         emas = {}
-        for period in self.ema_periods:
-            ema_value = self.calculate_ema(prices, period)
-            emas[f'EMA_{period}'] = ema_value
+        for period, ema_value in zip(self.ema_periods, values):
+            emas[f'EMA_{period}'] = float(ema_value) if len(prices) >= period else None
         return emas
     
-    def download_stock_data(self, symbol, days=365):
+    async def open_http_session(self):
+        """Create the aiohttp session used for downloads and pick up NSE cookies"""
+        connector = aiohttp.TCPConnector(limit=self.connection_limit)
+        http = aiohttp.ClientSession(headers=self.headers, connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=30))
+        await self.prime_http_session(http)
+        return http
+    
+    async def prime_http_session(self, http):
+        """Visit the NSE home page so the session carries fresh cookies"""
+        http.cookie_jar.clear()
+        try:
+            async with http.get(self.nse_main_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                await response.read()
+            self.logger.info("Session created successfully")
+        except Exception as e:
+            self.logger.error(f"Failed to create session: {e}")
+    
+    async def download_stock_data(self, http, symbol, days=365):
         """Download stock data for given symbol"""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
@@ -166,103 +327,243 @@ class EnhancedEMAScreener:
             'csv': 'true'
         }
         
-        self.refresh_session_if_needed()
-        
         for attempt in range(self.max_retries):
             try:
                 self.logger.debug(f"Downloading {symbol} from {start_str} to {end_str}")
                 
-                symbol_url = f"https://www.nseindia.com/get-quotes/equity?symbol={symbol}"
-                symbol_response = self.session.get(symbol_url)
-                time.sleep(1)
+                await asyncio.sleep(self.rate_limiter.reserve())
+                async with http.get(self.historical_api_url, params=params) as response:
+                    status = response.status
+                    content = await response.read()
                 
-                response = self.session.get(self.historical_api_url, params=params)
-                self.request_count += 1
+                if status in (401, 403):
+                    # Cookies expired - fetch new ones before retrying
+                    await self.prime_http_session(http)
                 
-                if response.status_code == 200:
-                    if response.text.strip().startswith("Date,") or "," in response.text:
-                        return response.text
+                if status == 200:
+                    # Raw bytes go straight to the CSV parser - no separate decode into a str
+                    if content.strip().startswith(b"Date,") or b"," in content:
+                        return content
                     else:
-                        self.logger.warning(f"Non-CSV response for {symbol}: {response.text[:100]}...")
+                        self.logger.warning(f"Non-CSV response for {symbol}: {content[:100]!r}...")
                         if attempt < self.max_retries - 1:
-                            time.sleep(self.rate_limit_delay * 2)
+                            await asyncio.sleep(self.rate_limit_delay * 2)
                         else:
                             return None
                 else:
-                    self.logger.warning(f"HTTP {response.status_code} for {symbol}")
+                    self.logger.warning(f"HTTP {status} for {symbol}")
                     if attempt < self.max_retries - 1:
-                        time.sleep(self.rate_limit_delay * 2)
+                        await asyncio.sleep(self.rate_limit_delay * 2)
                     else:
                         return None
                         
             except Exception as e:
                 self.logger.error(f"Error downloading {symbol}: {e}")
                 if attempt < self.max_retries - 1:
-                    time.sleep(self.rate_limit_delay * 2)
+                    await asyncio.sleep(self.rate_limit_delay * 2)
                 else:
                     return None
         
         return None
     
+    async def _download_one(self, http, semaphore, symbol):
+        """Download and save one symbol"""
+        async with semaphore:
+            csv_data = await self.download_stock_data(http, symbol)
+        
+        if not csv_data:
+            self.logger.error(f"[FAIL] Failed to download {symbol}")
+            return False
+        
+        # Parsing and writing Parquet is blocking work - keep it off the event loop
+        if not await asyncio.to_thread(self.save_stock_data, symbol, csv_data):
+            self.logger.error(f"[FAIL] Failed to save {symbol}")
+            return False
+        
+        self.logger.info(f"[DOWNLOADED] {symbol}")
+        return True
+    
+    async def _download_all(self, symbols):
+        """Download symbols concurrently on one event loop, returns how many were saved"""
+        semaphore = asyncio.Semaphore(self.download_workers)
+        download_count = 0
+        
+        http = await self.open_http_session()
+        async with http:
+            tasks = [self._download_one(http, semaphore, symbol) for symbol in symbols]
+            for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Downloading missing data"):
+                if await task:
+                    download_count += 1
+        
+        return download_count
+    
+    def stock_data_dir(self, symbol):
+        """Partition directory holding all of a stock's Parquet files"""
+        return self.data_file / f"symbol={symbol}"
+    
+    def stock_data_path(self, symbol):
+        """Parquet file holding a stock's base price history"""
+        return self.stock_data_dir(symbol) / "data.parquet"
+    
+    def stock_update_paths(self, symbol):
+        """Daily Parquet files appended after the base history, oldest first"""
+        return sorted(self.stock_data_dir(symbol).glob("update-*.parquet"))
+    
+    def legacy_data_path(self, symbol):
+        """Per-symbol CSV used before the Parquet store"""
+        return self.data_dir / f"{symbol}_1yr_data.csv"
+    
+    def has_stock_data(self, symbol):
+        """Check if price history exists for a stock"""
+        return self.stock_data_path(symbol).exists() or self.legacy_data_path(symbol).exists()
+    
+    def read_csv_arrow(self, source):
+        """Read an NSE CSV with pyarrow's multithreaded reader into a pandas frame"""
+        if isinstance(source, Path):
+            source = str(source)
+        
+        convert_options = pacsv.ConvertOptions(null_values=['-', ''], strings_can_be_null=True)
+        table = pacsv.read_csv(source, convert_options=convert_options)
+        
+        # Numbers like "1,67,734.50" arrive as strings - strip separators and cast inside Arrow
+        for i, field in enumerate(table.schema):
+            if pa.types.is_string(field.type):
+                try:
+                    numbers = pc.cast(pc.replace_substring(table.column(i), ',', ''), pa.float64())
+                except pa.ArrowInvalid:
+                    continue
+                table = table.set_column(i, field.name, numbers)
+        
+        return table.to_pandas(date_as_object=False)
+    
+    def read_stock_csv(self, source):
+        """Parse an NSE price CSV into typed Date/Close columns"""
+        return self.clean_stock_data(self.read_csv_arrow(source))
+    
+    def clean_stock_data(self, df):
+        """Convert a parsed NSE price frame to typed Date/Close columns"""
+        df.columns = df.columns.str.strip().str.strip('"').str.strip()
+        
+        if len(df.columns) > 0 and 'ï»¿' in df.columns[0]:
+            df.columns = [df.columns[0].replace('ï»¿', '').replace('"', '').strip()] + list(df.columns[1:])
+        
+        # The first price-like column (ltp, close, last or price) becomes Close
+        close_prices = None
+        for col in df.columns:
+            if col.lower() in ['close', 'ltp', 'last', 'price']:
+                close_prices = pd.to_numeric(df[col], errors='coerce')
+                if close_prices.notna().any():
+                    break
+        
+        if close_prices is None:
+            return None
+        
+        if 'Date' in df.columns:
+            # NSE files mix ISO dates with dd-mm-YYYY / dd-Mon-YYYY rows appended by older daily
+            # updates; ISO goes first because dayfirst would read 2025-08-12 as 8 December
+            dates = pd.to_datetime(df['Date'], format='ISO8601', errors='coerce')
+            other = dates.isna()
+            if other.any():
+                dates[other] = pd.to_datetime(df['Date'][other], format='mixed', dayfirst=True, errors='coerce')
+        else:
+            dates = pd.Series(pd.NaT, index=df.index)
+        
+        # Stored oldest to newest so loads never need to sort; rows without a usable date
+        # could not be placed in that order, so they are dropped
+        clean_df = pd.DataFrame({'Date': dates, 'Close': close_prices.astype(np.float32)})
+        clean_df = clean_df.dropna(subset=['Close'])
+        undated = clean_df['Date'].isna()
+        if 'Date' in df.columns and undated.any():
+            self.logger.warning(f"Dropping {int(undated.sum())} price rows with unparseable dates")
+            clean_df = clean_df[~undated]
+        clean_df = clean_df.sort_values('Date', ascending=True, kind='stable')
+        return clean_df.reset_index(drop=True)
+    
+    def write_stock_data(self, symbol, df):
+        """Write a stock's full typed Date/Close history to the Parquet store"""
+        file_path = self.stock_data_path(symbol)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        # float32 halves the bytes read per EMA pass; paise-precision prices fit comfortably
+        df = pd.DataFrame({'Date': df['Date'].astype('datetime64[ns]'), 'Close': df['Close'].astype(np.float32)})
+        df.to_parquet(file_path, engine='pyarrow', compression='snappy', index=False)
+        
+        # The full history replaces any daily files
+        for update_path in self.stock_update_paths(symbol):
+            update_path.unlink()
+        self._df_cache.pop(symbol, None)
+        return file_path
+    
+    def append_stock_data(self, symbol, date, close):
+        """Append one day's close as a new file in the stock's partition"""
+        # Files sort by name, so update-YYYYMMDD keeps the partition in date order
+        update_path = self.stock_data_dir(symbol) / f"update-{date.strftime('%Y%m%d')}.parquet"
+        df = pd.DataFrame({'Date': pd.Series([date], dtype='datetime64[ns]'), 'Close': np.array([close], dtype=np.float32)})
+        df.to_parquet(update_path, engine='pyarrow', compression='snappy', index=False)
+        self._df_cache.pop(symbol, None)
+        
+        # Fold the daily files back into the base file once too many pile up
+        if len(self.stock_update_paths(symbol)) > self.max_update_files:
+            self.write_stock_data(symbol, self.load_stock_data(symbol))
+        return update_path
+    
     def save_stock_data(self, symbol, csv_data):
         """Save stock data to file"""
         if not csv_data:
             return None
         
-        file_path = self.data_dir / f"{symbol}_1yr_data.csv"
-        
         try:
-            if csv_data.startswith('\ufeff'):
-                csv_data = csv_data[1:]
+            # Parse and type the data once here so loads never touch CSV text;
+            # the utf-8-sig decode inside the parser drops any BOM
+            df = self.read_stock_csv(BytesIO(csv_data))
+            if df is None:
+                self.logger.error(f"No close price column in data for {symbol}")
+                return None
             
-            with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                f.write(csv_data)
-            return file_path
+            return self.write_stock_data(symbol, df)
         except Exception as e:
             self.logger.error(f"Error saving data for {symbol}: {e}")
             return None
     
-    def load_stock_data(self, symbol):
-        """Load stock data from file"""
-        file_path = self.data_dir / f"{symbol}_1yr_data.csv"
+    def load_stock_data(self, symbol, columns=('Date', 'Close')):
+        """Load stock data from file, oldest first"""
+        file_path = self.stock_data_path(symbol)
+        legacy_path = self.legacy_data_path(symbol)
         
-        if not file_path.exists():
+        if not file_path.exists() and not legacy_path.exists():
             return None
         
         try:
-            df = pd.read_csv(file_path, encoding='utf-8-sig')
-            df.columns = df.columns.str.strip().str.strip('"').str.strip()
-            
-            if len(df.columns) > 0 and 'ï»¿' in df.columns[0]:
-                df.columns = [df.columns[0].replace('ï»¿', '').replace('"', '').strip()] + list(df.columns[1:])
+            if file_path.exists():
+                # Adding/removing daily files changes the directory mtime, rewrites change the base file's
+                cache_key = (self.stock_data_dir(symbol).stat().st_mtime_ns, file_path.stat().st_mtime_ns)
+                cached = self._df_cache.get(symbol)
+                if cached is not None and cached[0] == cache_key:
+                    return cached[1][list(columns)]
+                
+                # Reads the base file and any daily files in name (= date) order
+                df = pd.read_parquet(self.stock_data_dir(symbol), engine='pyarrow', columns=['Date', 'Close'])
+                self._df_cache[symbol] = (cache_key, df)
+                return df[list(columns)]
             
-            # CRITICAL FIX: Sort data by date to ensure newest data is last
-            if 'Date' in df.columns:
-                df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-                df = df.sort_values('Date', ascending=True)  # Oldest to newest
-                df = df.reset_index(drop=True)
+            # One-time migration of an old CSV into the Parquet store
+            df = self.read_stock_csv(legacy_path)
+            if df is None:
+                return None
+            self.write_stock_data(symbol, df)
             
-            return df
+            return df[list(columns)]
         except Exception as e:
             self.logger.error(f"Error loading data for {symbol}: {e}")
             return None
     
-    def calculate_stock_emas(self, symbol):
-        """Calculate all EMAs for a stock"""
-        df = self.load_stock_data(symbol)
+    def load_close_prices(self, symbol):
+        """Load close prices for a stock, oldest first"""
+        df = self.load_stock_data(symbol, columns=['Close'])
         
         if df is None:
             return None
         
-        # Get close prices
-        close_prices = []
-        for col in df.columns:
-            col_lower = col.lower()
-            if col_lower in ['close', 'ltp', 'last', 'price']:
-                cleaned_values = df[col].astype(str).str.replace(',', '').str.replace('"', '').str.strip()
-                close_prices = pd.to_numeric(cleaned_values, errors='coerce').dropna().tolist()
-                if len(close_prices) > 0:
-                    break
+        close_prices = df['Close'].to_numpy(dtype=np.float32)
         
         if len(close_prices) == 0:
             self.logger.error(f"No close price data for {symbol}")
@@ -274,23 +575,170 @@ class EnhancedEMAScreener:
             self.logger.warning(f"Insufficient data for {symbol}: {len(close_prices)} < {max_period}")
             return None
         
+        return close_prices
+    
+    def format_last_date(self, dates):
+        """Latest valid date of an oldest-first date array as YYYY-MM-DD, None if every date is missing"""
+        dates = pd.DatetimeIndex(dates).dropna()
+        return dates[-1].strftime('%Y-%m-%d') if len(dates) else None
+    
+    def load_all_close_prices(self, symbols):
+        """Load close prices and last price dates for many stocks with a single scan of the Parquet store"""
+        # Old CSVs are migrated first so the scan sees every symbol
+        for symbol in symbols:
+            if not self.stock_data_path(symbol).exists():
+                self.load_stock_data(symbol)
+        
+        if not self.data_file.exists():
+            return {}, {}
+        
+        df = pd.read_parquet(self.data_file, engine='pyarrow', columns=['symbol', 'Date', 'Close'],
+                             filters=[('symbol', 'in', list(symbols))])
+        df['symbol'] = df['symbol'].astype(str)
+        
+        # Each partition is stored oldest first, so a stable sort on symbol keeps date order
+        df = df.sort_values('symbol', kind='stable')
+        
+        # Rows are grouped by symbol, so each stock is a contiguous slice
+        symbol_values = df['symbol'].to_numpy()
+        close_values = df['Close'].to_numpy(dtype=np.float32)
+        date_values = df['Date'].to_numpy()
+        group_symbols, starts = np.unique(symbol_values, return_index=True)
+        ends = np.append(starts[1:], len(symbol_values))
+        groups = {symbol: close_values[start:end] for symbol, start, end in zip(group_symbols, starts, ends)}
+        last_dates = {symbol: self.format_last_date(date_values[start:end])
+                      for symbol, start, end in zip(group_symbols, starts, ends)}
+        
+        max_period = max(self.ema_periods)
+        price_series = {}
+        for symbol in symbols:
+            close_prices = groups.get(symbol)
+            if close_prices is None or len(close_prices) == 0:
+                self.logger.error(f"No close price data for {symbol}")
+            elif len(close_prices) < max_period:
+                self.logger.warning(f"Insufficient data for {symbol}: {len(close_prices)} < {max_period}")
+            else:
+                price_series[symbol] = close_prices
+        
+        return price_series, last_dates
+    
+    def calculate_stock_emas(self, symbol, state=None):
+        """Calculate all EMAs for a stock, continuing from a cached state when one is given"""
+        if state is not None:
+            emas = self.advance_stock_emas(symbol, state)
+            if emas is not None:
+                return emas
+        
+        close_prices = self.load_close_prices(symbol)
+        
+        if close_prices is None:
+            return None
+        
         # Calculate multiple EMAs
         emas = self.calculate_multiple_emas(close_prices)
-        emas['LAST_CLOSE'] = close_prices[-1]
+        emas['LAST_CLOSE'] = round(float(close_prices[-1]), 2)
+        emas['LAST_DATE'] = self.format_last_date(self.load_stock_data(symbol, columns=['Date'])['Date'])
         
         return emas
     
-    def update_ema_cache(self, symbol, ema_data):
-        """Update EMA cache with enhanced data structure"""
-        today = datetime.now().strftime('%Y-%m-%d')
+    def advance_stock_emas(self, symbol, state):
+        """Advance cached EMAs over the closes stored after the state's LAST_DATE
         
+        Returns None when the state cannot be continued and a full recalculation is needed.
+        """
+        prev_emas = [state.get(f'EMA_{period}') for period in self.ema_periods]
+        last_date = state.get('LAST_DATE')
+        if last_date is None or pd.isna(last_date) or any(ema is None or pd.isna(ema) for ema in prev_emas):
+            return None
+        
+        df = self.load_stock_data(symbol)
+        if df is None or df.empty:
+            return None
+        
+        # Rows are stored oldest first, so the new closes are a tail slice - unless a
+        # date failed to parse, which leaves its row unplaceable
+        dates = df['Date'].to_numpy()
+        if pd.isna(dates).any():
+            return None
+        last_date = np.datetime64(pd.Timestamp(last_date), 'ns')
+        start = np.searchsorted(dates, last_date, side='right')
+        if start == 0 or dates[start - 1] != last_date:
+            # LAST_DATE is not a stored row - the history was rewritten around the state
+            # (older, newer or gapped), so continuing it would skip or repeat days
+            return None
+        
+        close_prices = df['Close'].to_numpy(dtype=np.float32)
+        values = _ema_advance(close_prices[start:], self._alphas, *[float(ema) for ema in prev_emas])
+        
+        emas = {f'EMA_{period}': float(ema_value) for period, ema_value in zip(self.ema_periods, values)}
+        emas['LAST_CLOSE'] = round(float(close_prices[-1]), 2)
+        emas['LAST_DATE'] = self.format_last_date(dates)
+        return emas
+    
+    def calculate_batch_emas(self, price_series, last_dates=None):
+        """Calculate all EMAs for many stocks at once, in parallel across stocks"""
+        if not price_series:
+            return {}
+        
+        symbols = list(price_series.keys())
+        lengths = np.array([len(price_series[symbol]) for symbol in symbols], dtype=np.int64)
+        
+        # Pad every series into one contiguous block; rows are processed in parallel
+        prices = np.zeros((len(symbols), lengths.max()), dtype=np.float32)
+        for row, symbol in enumerate(symbols):
+            prices[row, :lengths[row]] = price_series[symbol]
+        
+        out = _ema_triple_batch(prices, lengths, self._alphas)
+        
+        results = {}
+        for row, symbol in enumerate(symbols):
+            emas = {f'EMA_{period}': float(out[row, i]) for i, period in enumerate(self.ema_periods)}
+            emas['LAST_CLOSE'] = round(float(out[row, 3]), 2)
+            if last_dates is not None:
+                emas['LAST_DATE'] = last_dates.get(symbol)
+            results[symbol] = emas
+        return results
+    
+    def add_band_columns(self, df, band_percentage=2.5):
+        """Add distance-from-EMA and within-band columns for every EMA period"""
+        for period in self.ema_periods:
+            ema = df[f'EMA_{period}']
+            diff = df['LAST_CLOSE'] - ema
+            df[f'WITHIN_BAND_{period}'] = diff.abs() / ema <= (band_percentage / 100)
+            df[f'DISTANCE_FROM_EMA_{period}'] = diff / ema * 100
+        return df
+    
+    def load_ema_cache(self, columns=None):
+        """Load the EMA cache (optionally only some columns), migrating the old CSV cache if needed"""
         if self.ema_cache_file.exists():
-            try:
-                cache_df = pd.read_csv(self.ema_cache_file)
-            except:
-                cache_df = pd.DataFrame()
-        else:
-            cache_df = pd.DataFrame()
+            return pd.read_parquet(self.ema_cache_file, engine='pyarrow', columns=columns)
+        
+        if not self.legacy_ema_cache_file.exists():
+            return pd.DataFrame()
+        
+        base_cols = ['SYMBOL'] + [f'EMA_{period}' for period in self.ema_periods] + ['LAST_CLOSE', 'DATE']
+        cache_df = pd.read_csv(self.legacy_ema_cache_file, usecols=base_cols)
+        cache_df = self.add_band_columns(cache_df)
+        self.save_ema_cache(cache_df)
+        return cache_df if columns is None else cache_df[list(columns)]
+    
+    def load_ema_states(self):
+        """Cached EMA rows keyed by symbol - the state later calculations continue from"""
+        cache_df = self.load_ema_cache()
+        if cache_df.empty:
+            return {}
+        return cache_df.set_index('SYMBOL').to_dict('index')
+    
+    def save_ema_cache(self, cache_df):
+        """Write the EMA cache"""
+        # float32 keeps ~7 significant digits - plenty for prices and percentages, half the bytes to read
+        float_cols = cache_df.select_dtypes(include='float64').columns
+        cache_df = cache_df.astype({col: np.float32 for col in float_cols})
+        cache_df.to_parquet(self.ema_cache_file, engine='pyarrow', compression='snappy', index=False)
+    
+    def update_ema_cache(self, symbol, ema_data):
+        """Update EMA cache with enhanced data structure (buffered until flush_ema_cache)"""
+        today = datetime.now().strftime('%Y-%m-%d')
         
         # Create enhanced record
         record = {
@@ -299,45 +747,56 @@ class EnhancedEMAScreener:
             'EMA_100': ema_data.get('EMA_100'), 
             'EMA_200': ema_data.get('EMA_200'),
             'LAST_CLOSE': ema_data.get('LAST_CLOSE'),
-            'DATE': today
+            'DATE': today,
+            'LAST_DATE': ema_data.get('LAST_DATE')  # date of the last close the EMAs include
         }
         
-        # Calculate band analysis (within ±2.5%)
-        if record['LAST_CLOSE'] and record['EMA_50']:
-            record['WITHIN_BAND_50'] = abs(record['LAST_CLOSE'] - record['EMA_50']) / record['EMA_50'] <= 0.025
-            record['DISTANCE_FROM_EMA_50'] = ((record['LAST_CLOSE'] - record['EMA_50']) / record['EMA_50'] * 100)
+        self._ema_records[symbol] = record
+    
+    def flush_ema_cache(self):
+        """Write all buffered EMA records to the cache in a single write"""
+        if not self._ema_records:
+            return
         
-        if record['LAST_CLOSE'] and record['EMA_100']:
-            record['WITHIN_BAND_100'] = abs(record['LAST_CLOSE'] - record['EMA_100']) / record['EMA_100'] <= 0.025
-            record['DISTANCE_FROM_EMA_100'] = ((record['LAST_CLOSE'] - record['EMA_100']) / record['EMA_100'] * 100)
-            
-        if record['LAST_CLOSE'] and record['EMA_200']:
-            record['WITHIN_BAND_200'] = abs(record['LAST_CLOSE'] - record['EMA_200']) / record['EMA_200'] <= 0.025
-            record['DISTANCE_FROM_EMA_200'] = ((record['LAST_CLOSE'] - record['EMA_200']) / record['EMA_200'] * 100)
-        
-        # Update or add entry
-        mask = cache_df['SYMBOL'] == symbol if 'SYMBOL' in cache_df.columns else pd.Series([False])
-        if mask.any():
-            for key, value in record.items():
-                cache_df.loc[mask, key] = value
+        # Calculate band analysis (within ±2.5%) for all records at once
+        new_df = pd.DataFrame.from_dict(self._ema_records, orient='index').reset_index(drop=True)
+        new_df = self.add_band_columns(new_df)
+        
+        try:
+            cache_df = self.load_ema_cache()
+        except Exception:
+            cache_df = pd.DataFrame()
+        
+        # Update or add entries, new records taking precedence over cached ones
+        if 'SYMBOL' in cache_df.columns:
+            cache_df = (new_df.set_index('SYMBOL')
+                        .combine_first(cache_df.set_index('SYMBOL'))
+                        .reset_index())
         else:
-            new_row = pd.DataFrame([record])
-            cache_df = pd.concat([cache_df, new_row], ignore_index=True)
+            cache_df = new_df
         
         # Save cache
-        cache_df.to_csv(self.ema_cache_file, index=False)
+        self.save_ema_cache(cache_df)
+        self._ema_records = {}
     
     def fetch_latest_market_data(self):
         """Fetch latest market data from NSE"""
-        self.refresh_session_if_needed()
-        
         try:
             self.logger.info("Fetching latest market data...")
-            response = self.session.get(self.latest_market_url, timeout=15)
+            for attempt in range(2):
+                session = self.refresh_session_if_needed()
+                response = session.get(self.latest_market_url, timeout=15)
+                
+                # NSE cookies expire - drop the session and retry once with fresh ones
+                if response.status_code in (401, 403) and attempt == 0:
+                    self.logger.warning(f"Market data request rejected ({response.status_code}), refreshing session")
+                    self.invalidate_session(session)
+                    continue
+                break
             
-            if response.status_code == 200 and response.text.strip():
+            if response.status_code == 200 and response.content.strip():
                 self.logger.info("Successfully fetched latest market data")
-                return response.text
+                return response.content
             else:
                 self.logger.error(f"Failed to fetch market data: {response.status_code}")
                 return None
@@ -347,23 +806,30 @@ class EnhancedEMAScreener:
             return None
     
     def parse_latest_market_data(self, csv_data):
-        """Parse latest market data and extract stock info"""
+        """Parse latest market data into a symbol -> last traded price mapping"""
         try:
-            from io import StringIO
-            df = pd.read_csv(StringIO(csv_data))
+            df = self.read_csv_arrow(BytesIO(csv_data))
             
             # Clean column names
-            df.columns = df.columns.str.strip().str.strip('"').str.strip()
+            df.columns = df.columns.str.strip().str.strip('\ufeff"').str.strip()
             
             # Extract relevant columns
-            stock_data = {}
-            for _, row in df.iterrows():
-                symbol = str(row.get('SYMBOL', '')).strip().strip('"')
-                if symbol and symbol != 'NIFTY TOTAL MARKET':
-                    stock_data[symbol] = {
-                        'ltp': row.get('LTP', row.get('CLOSE', 0)),
-                        'date': datetime.now().strftime('%d-%m-%Y')
-                    }
+            df = df.dropna(subset=['SYMBOL'])
+            df['SYMBOL'] = df['SYMBOL'].astype(str).str.strip().str.strip('"')
+            df = df[(df['SYMBOL'] != '') & (df['SYMBOL'] != 'NIFTY TOTAL MARKET')]
+            
+            if 'LTP' in df.columns:
+                ltp = df['LTP']
+                if 'CLOSE' in df.columns:
+                    ltp = ltp.fillna(df['CLOSE'])
+            elif 'CLOSE' in df.columns:
+                ltp = df['CLOSE']
+            else:
+                self.logger.error("No LTP/CLOSE column in latest market data")
+                return {}
+            
+            ltp = pd.to_numeric(ltp, errors='coerce')
+            stock_data = dict(zip(df['SYMBOL'], ltp.to_numpy(dtype=np.float64)))
             
             self.logger.info(f"Parsed {len(stock_data)} stocks from latest market data")
             return stock_data
@@ -372,6 +838,7 @@ class EnhancedEMAScreener:
             self.logger.error(f"Error parsing latest market data: {e}")
             return {}
     
+    @holds_update_lock
     def setup_phase(self):
         """Enhanced setup phase - check existing files first, then download only if needed"""
         self.logger.info("=== STARTING ENHANCED SETUP PHASE ===")
@@ -386,9 +853,8 @@ class EnhancedEMAScreener:
         missing_symbols = []
         
         for symbol in symbols:
-            file_path = self.data_dir / f"{symbol}_1yr_data.csv"
-            if file_path.exists():
-                existing_files[symbol] = file_path
+            if self.has_stock_data(symbol):
+                existing_files[symbol] = self.stock_data_path(symbol)
                 self.logger.info(f"[EXISTS] {symbol} data file found")
             else:
                 missing_symbols.append(symbol)
@@ -399,43 +865,31 @@ class EnhancedEMAScreener:
         download_count = 0
         ema_count = 0
         
-        # Download missing files only
+        # Download missing files only - requests overlap on an event loop, the rate limiter keeps NSE happy
         if missing_symbols:
-            with tqdm(total=len(missing_symbols), desc="Downloading missing data") as pbar:
-                for symbol in missing_symbols:
-                    pbar.set_description(f"Downloading {symbol}")
-                    
-                    csv_data = self.download_stock_data(symbol)
-                    
-                    if csv_data:
-                        saved_file = self.save_stock_data(symbol, csv_data)
-                        if saved_file:
-                            download_count += 1
-                            self.logger.info(f"[DOWNLOADED] {symbol}")
-                        else:
-                            self.logger.error(f"[FAIL] Failed to save {symbol}")
-                    else:
-                        self.logger.error(f"[FAIL] Failed to download {symbol}")
-                    
-                    pbar.update(1)
-                    time.sleep(self.rate_limit_delay)
+            download_count = asyncio.run(self._download_all(missing_symbols))
         
         # Calculate EMAs for all symbols (existing + downloaded)
-        all_symbols_with_data = list(existing_files.keys()) + [s for s in missing_symbols if (self.data_dir / f"{s}_1yr_data.csv").exists()]
+        all_symbols_with_data = list(existing_files.keys()) + [s for s in missing_symbols if self.has_stock_data(s)]
         
-        with tqdm(total=len(all_symbols_with_data), desc="Calculating EMAs") as pbar:
-            for symbol in all_symbols_with_data:
-                pbar.set_description(f"EMA for {symbol}")
-                
-                ema_data = self.calculate_stock_emas(symbol)
-                if ema_data:
-                    self.update_ema_cache(symbol, ema_data)
-                    ema_count += 1
-                    self.logger.info(f"[OK] {symbol} - EMAs: 50:{ema_data['EMA_50']:.2f}, 100:{ema_data['EMA_100']:.2f}, 200:{ema_data['EMA_200']:.2f}")
-                else:
-                    self.logger.warning(f"[SKIP] Could not calculate EMAs for {symbol}")
-                
-                pbar.update(1)
+        self.logger.info(f"Loading price data for {len(all_symbols_with_data)} stocks...")
+        price_series, last_dates = self.load_all_close_prices(all_symbols_with_data)
+        
+        for symbol in all_symbols_with_data:
+            if symbol not in price_series:
+                self.logger.warning(f"[SKIP] Could not calculate EMAs for {symbol}")
+        
+        # EMAs for all stocks are computed in one parallel batch
+        self.logger.info(f"Calculating EMAs for {len(price_series)} stocks...")
+        batch_emas = self.calculate_batch_emas(price_series, last_dates)
+        
+        for symbol, ema_data in batch_emas.items():
+            self.update_ema_cache(symbol, ema_data)
+            ema_count += 1
+            self.logger.info(f"[OK] {symbol} - EMAs: 50:{ema_data['EMA_50']:.2f}, 100:{ema_data['EMA_100']:.2f}, 200:{ema_data['EMA_200']:.2f}")
+        
+        # Cache is written once for the whole run
+        self.flush_ema_cache()
         
         # Save completion status
         with open(self.last_update_file, 'w') as f:
@@ -456,12 +910,12 @@ class EnhancedEMAScreener:
         
         return True
     
+    @holds_update_lock
     def daily_update_phase(self):
         """Enhanced daily update with latest market data"""
         self.logger.info("=== STARTING DAILY UPDATE PHASE ===")
         
         now = datetime.now()
-        market_close_time = now.replace(hour=15, minute=30, second=0, microsecond=0)
         
         # Check last update
         last_update_date = None
@@ -471,7 +925,7 @@ class EnhancedEMAScreener:
                 last_update_date = datetime.fromisoformat(data['last_update']).date()
         
         # Check if update needed
-        if now.date() > last_update_date and now >= market_close_time:
+        if (last_update_date is None or now.date() > last_update_date) and now.time() >= MARKET_CLOSE:
             self.logger.info("Market closed for the day, fetching latest data...")
             
             # Fetch latest market data
@@ -490,30 +944,29 @@ class EnhancedEMAScreener:
             updated_count = 0
             symbols = self.read_nifty_symbols()
             
+            # Every latest price belongs to today's session
+            trade_date = pd.Timestamp(now.date())
+            
+            # Cached EMAs only need the closes after their LAST_DATE instead of a full recompute
+            cached_emas = self.load_ema_states()
+            
             with tqdm(total=len(symbols), desc="Updating daily data") as pbar:
                 for symbol in symbols:
                     pbar.set_description(f"Updating {symbol}")
                     
                     if symbol in latest_stocks:
-                        # Add latest day data to existing file
-                        file_path = self.data_dir / f"{symbol}_1yr_data.csv"
-                        if file_path.exists():
+                        # Add latest day data to existing history
+                        close = latest_stocks[symbol]
+                        if self.has_stock_data(symbol) and pd.notna(close):
                             try:
-                                df = self.load_stock_data(symbol)
-                                if df is not None:
-                                    # Add new row for today
-                                    new_row = {
-                                        'Date': latest_stocks[symbol]['date'],
-                                        'close': latest_stocks[symbol]['ltp'],
-                                        'ltp': latest_stocks[symbol]['ltp']
-                                    }
+                                # Old CSV histories are migrated before anything is appended
+                                if self.stock_data_path(symbol).exists() or self.load_stock_data(symbol) is not None:
+                                    # Append new row - no need to re-read or rewrite the history
+                                    self.append_stock_data(symbol, trade_date, close)
                                     
-                                    # Append new row
-                                    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                                    df.to_csv(file_path, index=False)
+                                    # Advance cached EMAs over the new rows, full recalculation only without a usable state
+                                    ema_data = self.calculate_stock_emas(symbol, cached_emas.get(symbol))
                                     
-                                    # Recalculate EMAs
-                                    ema_data = self.calculate_stock_emas(symbol)
                                     if ema_data:
                                         self.update_ema_cache(symbol, ema_data)
                                         updated_count += 1
@@ -523,6 +976,8 @@ class EnhancedEMAScreener:
                     
                     pbar.update(1)
             
+            self.flush_ema_cache()
+            
             # Update status
             with open(self.last_update_file, 'w') as f:
                 json.dump({
@@ -537,23 +992,18 @@ class EnhancedEMAScreener:
             self.logger.info("No update needed - either not a new day or market still open")
             return False
     
-    def get_ema_data(self, ema_filter=None, band_percentage=2.5):
-        """Get EMA data with filtering options"""
-        if not self.ema_cache_file.exists():
-            return pd.DataFrame()
-        
+    def get_ema_data(self, ema_filter=None, band_percentage=2.5, columns=None):
+        """Get EMA data with filtering options, reading only the given cache columns if set"""
         try:
-            df = pd.read_csv(self.ema_cache_file)
+            df = self.load_ema_cache(columns=columns)
             
             # Apply EMA filter
             if ema_filter in ['50', '100', '200']:
-                band_col = f'WITHIN_BAND_{ema_filter}'
-                if band_col in df.columns:
-                    # Recalculate band with custom percentage
-                    ema_col = f'EMA_{ema_filter}'
-                    if ema_col in df.columns and 'LAST_CLOSE' in df.columns:
-                        custom_band = abs(df['LAST_CLOSE'] - df[ema_col]) / df[ema_col] <= (band_percentage / 100)
-                        df = df[custom_band]
+                # Recalculate band with custom percentage
+                ema_col = f'EMA_{ema_filter}'
+                if ema_col in df.columns and 'LAST_CLOSE' in df.columns:
+                    band = band_percentage / 100
+                    df = df[df.eval(f"abs(LAST_CLOSE - {ema_col}) / {ema_col} <= @band")]
             
             return df
             
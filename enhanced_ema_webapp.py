@@ -14,17 +14,40 @@ Features:
 Author: Generated for trading analysis
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
 import json
-from datetime import datetime
+from datetime import datetime, date
 from pathlib import Path
+from functools import lru_cache
 import logging
-from enhanced_ema_screener import EnhancedEMAScreener
+import threading
+from enhanced_ema_screener import EnhancedEMAScreener, MARKET_CLOSE
+
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 app = Flask(__name__)
 app.secret_key = 'enhanced_ema_screener_secret_key'
 
+if ORJSON_AVAILABLE:
+    class OrjsonProvider(JSONProvider):
+        """Flask JSON provider backed by orjson - also serializes NumPy scalars and arrays"""
+        
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+    
+    app.json = OrjsonProvider(app)
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,28 +55,33 @@ logger = logging.getLogger(__name__)
 # Initialize Enhanced EMA Screener
 screener = EnhancedEMAScreener()
 
+# Setup and updates mutate the shared screener (EMA buffer, price cache, session), so only one runs at a time
+update_lock = threading.Lock()
+
+# EMA cache columns the dashboard shows - the rest of the cache is never read by the data endpoints
+DASHBOARD_COLUMNS = ['SYMBOL', 'LAST_CLOSE', 'EMA_50', 'EMA_100', 'EMA_200',
+                     'DISTANCE_FROM_EMA_50', 'DISTANCE_FROM_EMA_100', 'DISTANCE_FROM_EMA_200', 'DATE']
+
 def check_and_update_data_on_startup():
     """Check for new data and update if needed on app startup"""
     try:
         logger.info("Checking for data updates on startup...")
         
-        # Check if we need to update data
-        now = datetime.now()
-        market_close_time = now.replace(hour=15, minute=30, second=0, microsecond=0)
-        
-        # Check last update
-        last_update_file = screener.cache_dir / "last_update.json"
-        last_update_date = None
-        
-        if last_update_file.exists():
-            with open(last_update_file, 'r') as f:
-                data = json.load(f)
-                last_update_date = datetime.fromisoformat(data['last_update']).date()
+        # Check last update - the file is rewritten by every update, so its mtime gives the date without parsing it
+        last_update_file = screener.last_update_file
+        try:
+            last_update_date = datetime.fromtimestamp(last_update_file.stat().st_mtime).date()
+        except FileNotFoundError:
+            last_update_date = None
         
         # If it's a new day and past market close, trigger update
-        if last_update_date is None or (now.date() > last_update_date and now >= market_close_time):
+        if last_update_date is None or (date.today() > last_update_date and datetime.now().time() >= MARKET_CLOSE):
+            if last_update_date is not None:
+                with open(last_update_file, 'r') as f:
+                    logger.info(f"Last update: {json.load(f).get('last_update', 'Unknown')}")
             logger.info("New trading day detected, updating data...")
-            success = screener.daily_update_phase()
+            with update_lock:
+                success = screener.daily_update_phase()
             if success:
                 logger.info("Data updated successfully on startup")
             else:
@@ -64,20 +92,114 @@ def check_and_update_data_on_startup():
     except Exception as e:
         logger.error(f"Error checking data on startup: {e}")
 
-# Check for updates on startup (but don't block app initialization)
-import threading
-def startup_check():
-    check_and_update_data_on_startup()
-
-# Run startup check in background thread
-startup_thread = threading.Thread(target=startup_check, daemon=True)
-startup_thread.start()
-
 @app.route('/')
 def index():
     """Main enhanced dashboard page"""
     return render_template('enhanced_index.html')
 
+def _file_mtime(path):
+    """Modification time of a file in nanoseconds, 0 if it does not exist"""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+class SymbolIndex:
+    """Substring search over a fixed list of symbols, backed by one NUL-separated bytes blob"""
+    
+    def __init__(self, symbols):
+        encoded = [str(symbol).upper().encode() for symbol in symbols]
+        self.blob = b'\x00' + b'\x00'.join(encoded) + b'\x00'
+        
+        # Byte offset of the separator in front of each symbol, ascending
+        lengths = np.fromiter((len(symbol) + 1 for symbol in encoded), dtype=np.int64, count=len(encoded))
+        self.positions = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    
+    def search(self, term):
+        """Row positions of the symbols containing term (case-insensitive), in row order"""
+        needle = term.upper().encode()
+        if not needle:
+            return np.arange(len(self.positions))
+        if b'\x00' in needle:
+            return np.empty(0, dtype=np.int64)
+        
+        # bytes.find is a memchr-accelerated scan; every hit is mapped back to its row afterwards
+        offsets = []
+        offset = self.blob.find(needle)
+        while offset != -1:
+            offsets.append(offset)
+            offset = self.blob.find(needle, offset + 1)
+        
+        rows = np.searchsorted(self.positions, np.array(offsets, dtype=np.int64), side='right') - 1
+        return np.unique(rows)
+
+@lru_cache(maxsize=16)
+def _load_dashboard_data(ema_filter, band_percentage, mtime):
+    """Filtered dashboard rows and their symbol index - mtime only keys the cache"""
+    if ema_filter == 'all':
+        df = screener.get_ema_data(columns=DASHBOARD_COLUMNS)
+    else:
+        df = screener.get_ema_data(ema_filter=ema_filter, band_percentage=band_percentage, columns=DASHBOARD_COLUMNS)
+    
+    symbols = df['SYMBOL'].fillna('') if 'SYMBOL' in df.columns else []
+    return df, SymbolIndex(symbols)
+
+@lru_cache(maxsize=64)
+def _build_ema_json(ema_filter, band_percentage, mtime):
+    """Serialized /api/ema-data response - mtime only keys the cache so a rewritten cache file is picked up"""
+    # Get filtered data
+    df, _ = _load_dashboard_data(ema_filter, band_percentage, mtime)
+    
+    if df.empty:
+        return app.json.dumps({
+            'status': 'error',
+            'message': 'No EMA data available. Please run setup first.',
+            'data': []
+        }).encode()
+    
+    # Add row numbers
+    df = df.reset_index(drop=True)
+    df['ROW_NUMBER'] = np.arange(1, len(df) + 1, dtype=np.int32)
+    
+    # Rows are serialized by pandas' C JSON writer, no intermediate dicts
+    data_json = df.to_json(orient='records', date_format='iso', double_precision=4)
+    
+    # Calculate summary statistics
+    total_stocks = len(df)
+    
+    # Count stocks above each EMA and average distances from one (N, 3) block of EMAs
+    ema_cols = ['EMA_50', 'EMA_100', 'EMA_200']
+    above_ema = np.zeros(3, dtype=np.int64)
+    avg_distance = np.zeros(3)
+    
+    if all(col in df.columns for col in ema_cols + ['LAST_CLOSE']):
+        ema_block = df[ema_cols].to_numpy(dtype=np.float32)
+        diff = df['LAST_CLOSE'].to_numpy(dtype=np.float32)[:, None] - ema_block
+        above_ema = (diff > 0).sum(axis=0)
+        avg_distance = np.nanmean(diff / ema_block * np.float32(100.0), axis=0)
+    
+    above_ema_50, above_ema_100, above_ema_200 = above_ema
+    avg_distance_50, avg_distance_100, avg_distance_200 = avg_distance
+    
+    summary_json = app.json.dumps({
+        'total_stocks': total_stocks,
+        'above_ema_50': int(above_ema_50),
+        'above_ema_100': int(above_ema_100),
+        'above_ema_200': int(above_ema_200),
+        'above_ema_50_percentage': round(above_ema_50 / total_stocks * 100, 1) if total_stocks > 0 else 0,
+        'above_ema_100_percentage': round(above_ema_100 / total_stocks * 100, 1) if total_stocks > 0 else 0,
+        'above_ema_200_percentage': round(above_ema_200 / total_stocks * 100, 1) if total_stocks > 0 else 0,
+        'avg_distance_50': round(float(avg_distance_50), 2),
+        'avg_distance_100': round(float(avg_distance_100), 2),
+        'avg_distance_200': round(float(avg_distance_200), 2),
+        'filter_applied': ema_filter,
+        'band_percentage': band_percentage,
+        # When the EMA cache was last written - a response-time clock would go stale inside the cached body
+        'last_update': datetime.fromtimestamp(mtime / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+    })
+    
+    return f'{{"status": "success", "data": {data_json}, "summary": {summary_json}}}'.encode()
+
 @app.route('/api/ema-data')
 def get_ema_data():
     """API endpoint to get enhanced EMA data"""
@@ -86,66 +208,9 @@ def get_ema_data():
         ema_filter = request.args.get('ema_filter', 'all')  # all, 50, 100, 200
         band_percentage = float(request.args.get('band_percentage', 2.5))
         
-        # Get filtered data
-        if ema_filter == 'all':
-            df = screener.get_ema_data()
-        else:
-            df = screener.get_ema_data(ema_filter=ema_filter, band_percentage=band_percentage)
-        
-        if df.empty:
-            return jsonify({
-                'status': 'error',
-                'message': 'No EMA data available. Please run setup first.',
-                'data': []
-            })
-        
-        # Add row numbers
-        df = df.reset_index(drop=True)
-        df['ROW_NUMBER'] = df.index + 1
-        
-        # Convert to dict for JSON serialization
-        data = df.to_dict('records')
-        
-        # Calculate summary statistics
-        total_stocks = len(df)
-        
-        # Count stocks above each EMA
-        above_ema_50 = 0
-        above_ema_100 = 0
-        above_ema_200 = 0
-        
-        if 'LAST_CLOSE' in df.columns:
-            if 'EMA_50' in df.columns:
-                above_ema_50 = (df['LAST_CLOSE'] > df['EMA_50']).sum()
-            if 'EMA_100' in df.columns:
-                above_ema_100 = (df['LAST_CLOSE'] > df['EMA_100']).sum()
-            if 'EMA_200' in df.columns:
-                above_ema_200 = (df['LAST_CLOSE'] > df['EMA_200']).sum()
-        
-        # Average distances
-        avg_distance_50 = df['DISTANCE_FROM_EMA_50'].mean() if 'DISTANCE_FROM_EMA_50' in df.columns else 0
-        avg_distance_100 = df['DISTANCE_FROM_EMA_100'].mean() if 'DISTANCE_FROM_EMA_100' in df.columns else 0
-        avg_distance_200 = df['DISTANCE_FROM_EMA_200'].mean() if 'DISTANCE_FROM_EMA_200' in df.columns else 0
-        
-        return jsonify({
-            'status': 'success',
-            'data': data,
-            'summary': {
-                'total_stocks': total_stocks,
-                'above_ema_50': int(above_ema_50),
-                'above_ema_100': int(above_ema_100),
-                'above_ema_200': int(above_ema_200),
-                'above_ema_50_percentage': round(above_ema_50 / total_stocks * 100, 1) if total_stocks > 0 else 0,
-                'above_ema_100_percentage': round(above_ema_100 / total_stocks * 100, 1) if total_stocks > 0 else 0,
-                'above_ema_200_percentage': round(above_ema_200 / total_stocks * 100, 1) if total_stocks > 0 else 0,
-                'avg_distance_50': round(avg_distance_50, 2),
-                'avg_distance_100': round(avg_distance_100, 2),
-                'avg_distance_200': round(avg_distance_200, 2),
-                'filter_applied': ema_filter,
-                'band_percentage': band_percentage,
-                'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        })
+        # Serve the cached response until the EMA cache file changes
+        body = _build_ema_json(ema_filter, band_percentage, _file_mtime(screener.ema_cache_file))
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error getting EMA data: {e}")
@@ -164,38 +229,38 @@ def get_filtered_data():
         band_percentage = float(request.args.get('band_percentage', 2.5))
         sort_by = request.args.get('sort', 'SYMBOL')
         sort_order = request.args.get('order', 'asc')
-        search_term = request.args.get('search', '').upper()
+        search_term = request.args.get('search', '')
         
-        # Get base data
-        if ema_filter == 'all':
-            df = screener.get_ema_data()
-        else:
-            df = screener.get_ema_data(ema_filter=ema_filter, band_percentage=band_percentage)
+        # Get base data, cached with its symbol index until the EMA cache file changes
+        df, symbol_index = _load_dashboard_data(ema_filter, band_percentage, _file_mtime(screener.ema_cache_file))
         
         if df.empty:
             return jsonify({'status': 'error', 'message': 'No data available', 'data': []})
         
-        # Apply search
+        # Apply search - the term is matched literally and case-insensitively
         if search_term:
-            df = df[df['SYMBOL'].str.contains(search_term, na=False)]
+            df = df.iloc[symbol_index.search(search_term)]
         
-        # Apply sorting
+        # Apply sorting - numeric columns take a single-key argsort, negated for descending
+        # order so ties keep their order and NaN (which stays NaN) still sorts last
         if sort_by in df.columns:
-            ascending = sort_order == 'asc'
-            df = df.sort_values(by=sort_by, ascending=ascending)
+            column = df[sort_by]
+            if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+                values = column.to_numpy(dtype=np.float64)
+                order = np.argsort(values if sort_order == 'asc' else -values, kind='stable')
+                df = df.iloc[order]
+            else:
+                df = df.sort_values(sort_by, ascending=(sort_order == 'asc'), kind='stable')
         
         # Add row numbers
         df = df.reset_index(drop=True)
-        df['ROW_NUMBER'] = df.index + 1
+        df['ROW_NUMBER'] = np.arange(1, len(df) + 1, dtype=np.int32)
         
-        # Convert to dict
-        data = df.to_dict('records')
+        # Rows are serialized by pandas' C JSON writer, no intermediate dicts
+        data_json = df.to_json(orient='records', date_format='iso', double_precision=4)
         
-        return jsonify({
-            'status': 'success',
-            'data': data,
-            'total_filtered': len(data)
-        })
+        body = f'{{"status": "success", "data": {data_json}, "total_filtered": {len(df)}}}'
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error filtering data: {e}")
@@ -209,7 +274,9 @@ def get_filtered_data():
 def update_data():
     """API endpoint to trigger daily update"""
     try:
-        success = screener.daily_update_phase()
+        with update_lock:
+            success = screener.daily_update_phase()
+            clear_response_caches()
         
         if success:
             return jsonify({
@@ -233,7 +300,9 @@ def update_data():
 def run_setup():
     """API endpoint to run enhanced setup"""
     try:
-        success = screener.setup_phase()
+        with update_lock:
+            success = screener.setup_phase()
+            clear_response_caches()
         
         if success:
             return jsonify({
@@ -253,39 +322,60 @@ def run_setup():
             'message': str(e)
         })
 
+@lru_cache(maxsize=8)
+def _build_status_json(cache_mtime, update_mtime):
+    """Serialized /api/status response - keyed on the cache and last-update file mtimes"""
+    last_update_file = screener.last_update_file
+    
+    status = {
+        'cache_exists': screener.ema_cache_file.exists() or screener.legacy_ema_cache_file.exists(),
+        'cache_size': 0,
+        'last_update': 'Never',
+        'phase': 'Not started',
+        'has_enhanced_features': True
+    }
+    
+    # Row count and column names come from the file metadata / header - no rows are parsed
+    cache_size = 0
+    if screener.ema_cache_file.exists():
+        metadata = pq.read_metadata(screener.ema_cache_file)
+        cache_size = metadata.num_rows
+        columns = metadata.schema.names
+    elif screener.legacy_ema_cache_file.exists():
+        columns = pd.read_csv(screener.legacy_ema_cache_file, nrows=0).columns
+        with open(screener.legacy_ema_cache_file, 'rb', buffering=1 << 20) as f:
+            cache_size = sum(buf.count(b'\n') for buf in iter(lambda: f.read(1 << 20), b'')) - 1
+    
+    if cache_size > 0:
+        status['cache_size'] = cache_size
+        
+        # Check if enhanced columns exist
+        enhanced_cols = ['EMA_50', 'EMA_100', 'EMA_200', 'WITHIN_BAND_50', 'WITHIN_BAND_100', 'WITHIN_BAND_200']
+        status['has_enhanced_features'] = all(col in columns for col in enhanced_cols)
+    
+    if last_update_file.exists():
+        with open(last_update_file, 'r') as f:
+            update_data = json.load(f)
+        status['last_update'] = update_data.get('last_update', 'Unknown')
+        status['phase'] = update_data.get('phase', 'Unknown')
+    
+    return app.json.dumps({
+        'status': 'success',
+        'data': status
+    }).encode()
+
+def clear_response_caches():
+    """Drop cached API responses after the data has been rewritten"""
+    _load_dashboard_data.cache_clear()
+    _build_ema_json.cache_clear()
+    _build_status_json.cache_clear()
+
 @app.route('/api/status')
 def get_status():
     """API endpoint to get enhanced system status"""
     try:
-        cache_file = screener.cache_dir / "enhanced_ema_cache.csv"
-        last_update_file = screener.cache_dir / "last_update.json"
-        
-        status = {
-            'cache_exists': cache_file.exists(),
-            'cache_size': 0,
-            'last_update': 'Never',
-            'phase': 'Not started',
-            'has_enhanced_features': True
-        }
-        
-        if cache_file.exists():
-            df = pd.read_csv(cache_file)
-            status['cache_size'] = len(df)
-            
-            # Check if enhanced columns exist
-            enhanced_cols = ['EMA_50', 'EMA_100', 'EMA_200', 'WITHIN_BAND_50', 'WITHIN_BAND_100', 'WITHIN_BAND_200']
-            status['has_enhanced_features'] = all(col in df.columns for col in enhanced_cols)
-        
-        if last_update_file.exists():
-            with open(last_update_file, 'r') as f:
-                update_data = json.load(f)
-            status['last_update'] = update_data.get('last_update', 'Unknown')
-            status['phase'] = update_data.get('phase', 'Unknown')
-        
-        return jsonify({
-            'status': 'success',
-            'data': status
-        })
+        body = _build_status_json(_file_mtime(screener.ema_cache_file), _file_mtime(screener.last_update_file))
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error getting status: {e}")
@@ -305,6 +395,11 @@ if __name__ == '__main__':
     print("Starting Flask server...")
     print("Open http://localhost:5000 in your browser")
     
+    # Check for updates in the background (but don't block app initialization);
+    # under Gunicorn this runs once from when_ready in gunicorn_config.py instead
+    startup_thread = threading.Thread(target=check_and_update_data_on_startup, daemon=True)
+    startup_thread.start()
+    
     # Development server
     app.run(debug=True, host='0.0.0.0', port=5000)
 else:
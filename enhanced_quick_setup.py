@@ -12,9 +12,67 @@ Author: Generated for trading analysis
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from multiprocessing import Pool
 from tqdm import tqdm
 from enhanced_ema_screener import EnhancedEMAScreener
 
+# Columns read from the 15-year files - Date plus the price columns clean_stock_data picks Close from
+PRICE_COLUMNS = {'date', 'close', 'ltp', 'last', 'price'}
+
+def _column_name(col):
+    """Column name without quotes, padding or a mis-decoded BOM"""
+    return col.replace('ï»¿', '').strip().strip('"').strip()
+
+# Screener used by each worker process, created once by _init_worker
+_worker_screener = None
+
+def _init_worker():
+    """Create the worker process's screener"""
+    global _worker_screener
+    _worker_screener = EnhancedEMAScreener()
+
+def _symbol_from_path(file_path):
+    """Extract symbol from filename"""
+    return file_path.stem.replace("_15yr_data", "")
+
+def _process_file(job):
+    """Store one stock's latest year of data and calculate its EMAs - runs in a worker process
+    
+    job is (file_path, cached EMA state or None). Returns (symbol, saved, ema_data);
+    the EMA cache itself is only touched by the parent.
+    """
+    screener = _worker_screener
+    file_path, state = job
+    symbol = _symbol_from_path(file_path)
+    
+    try:
+        # Read existing data - only the date and price columns are parsed
+        df = pd.read_csv(file_path, encoding='utf-8-sig', thousands=',', na_values=['-'],
+                         usecols=lambda col: _column_name(col).lower() in PRICE_COLUMNS)
+        df.columns = [_column_name(col) for col in df.columns]
+        
+        # CRITICAL FIX: Get latest 1 year of data, ensuring proper date sorting
+        if 'Date' in df.columns:
+            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+            df = df.sort_values('Date', ascending=True)  # Oldest to newest
+            df = df.tail(365)  # Get latest 365 days
+        else:
+            df = df.tail(365)
+        
+        # Store in the enhanced system's Parquet dataset
+        price_df = screener.clean_stock_data(df)
+        if price_df is None:
+            print(f"No close price data for {symbol}")
+            return symbol, False, None
+        screener.write_stock_data(symbol, price_df)
+        
+        # Calculate enhanced EMAs - a cached state only needs the days after its LAST_DATE
+        return symbol, True, screener.calculate_stock_emas(symbol, state)
+        
+    except Exception as e:
+        print(f"Error processing {symbol}: {e}")
+        return symbol, False, None
+
 def main():
     """Quick setup using existing data"""
     print("Enhanced EMA Screener Quick Setup")
@@ -27,7 +85,6 @@ def main():
     
     # Paths
     existing_data_dir = Path("stock_data")
-    target_data_dir = screener.data_dir
     
     if not existing_data_dir.exists():
         print("❌ stock_data/ directory not found!")
@@ -48,52 +105,31 @@ def main():
     successful_count = 0
     ema_count = 0
     
-    # Process each file
-    with tqdm(total=len(existing_files), desc="Processing enhanced EMAs") as pbar:
-        for file_path in existing_files:
-            # Extract symbol from filename
-            symbol = file_path.stem.replace("_15yr_data", "")
-            pbar.set_description(f"Processing {symbol}")
-            
-            try:
-                # Read existing data
-                df = pd.read_csv(file_path, encoding='utf-8-sig')
-                df.columns = df.columns.str.strip().str.strip('"').str.strip()
-                
-                # Clean BOM if present
-                if len(df.columns) > 0 and 'ï»¿' in df.columns[0]:
-                    df.columns = [df.columns[0].replace('ï»¿', '').replace('"', '').strip()] + list(df.columns[1:])
-                
-                # CRITICAL FIX: Get latest 1 year of data, ensuring proper date sorting
-                if 'Date' in df.columns:
-                    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-                    df = df.sort_values('Date', ascending=True)  # Oldest to newest
-                    df = df.tail(365)  # Get latest 365 days
-                else:
-                    df = df.tail(365)
-                
-                # Target file for enhanced system
-                target_file = target_data_dir / f"{symbol}_1yr_data.csv"
-                df.to_csv(target_file, index=False)
+    # EMA states from the previous run
+    states = screener.load_ema_states()
+    jobs = [(file_path, states.get(_symbol_from_path(file_path))) for file_path in existing_files]
+    
+    # Process files in parallel - each symbol is independent, the EMA cache is updated here only
+    with Pool(initializer=_init_worker) as pool, tqdm(total=len(existing_files), desc="Processing enhanced EMAs") as pbar:
+        for symbol, saved, ema_data in pool.imap_unordered(_process_file, jobs, chunksize=4):
+            if saved:
                 successful_count += 1
-                
-                # Calculate enhanced EMAs
-                ema_data = screener.calculate_stock_emas(symbol)
-                if ema_data:
-                    screener.update_ema_cache(symbol, ema_data)
-                    ema_count += 1
-                    pbar.set_postfix({
-                        "EMAs": ema_count,
-                        "50": f"{ema_data['EMA_50']:.0f}" if ema_data['EMA_50'] else "N/A",
-                        "100": f"{ema_data['EMA_100']:.0f}" if ema_data['EMA_100'] else "N/A", 
-                        "200": f"{ema_data['EMA_200']:.0f}" if ema_data['EMA_200'] else "N/A"
-                    })
-                
-            except Exception as e:
-                print(f"Error processing {symbol}: {e}")
+            
+            if ema_data:
+                screener.update_ema_cache(symbol, ema_data)
+                ema_count += 1
+                pbar.set_postfix({
+                    "EMAs": ema_count,
+                    "50": f"{ema_data['EMA_50']:.0f}" if ema_data['EMA_50'] else "N/A",
+                    "100": f"{ema_data['EMA_100']:.0f}" if ema_data['EMA_100'] else "N/A", 
+                    "200": f"{ema_data['EMA_200']:.0f}" if ema_data['EMA_200'] else "N/A"
+                })
             
             pbar.update(1)
     
+    # Write all calculated EMAs to the cache at once
+    screener.flush_ema_cache()
+    
     print()
     print("🎉 Enhanced Quick Setup Complete!")
     print(f"✓ Processed {successful_count} stock files")
@@ -3,14 +3,18 @@
 
 import multiprocessing
 import os
+import subprocess
+import sys
 
 # Server socket
 bind = "0.0.0.0:5001"
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# Worker processes - threaded workers overlap the I/O-bound API requests,
+# so fewer processes are needed than with sync workers
+workers = max(2, multiprocessing.cpu_count())
+worker_class = "gthread"
+threads = 4
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -49,6 +53,14 @@ limit_request_field_size = 8190
 def when_ready(server):
     """Called just after the server is started."""
     server.log.info("Enhanced EMA Screener server is ready. Workers: %s", server.cfg.workers)
+    
+    # Run the startup data check once, in its own process, so no worker blocks or races on it
+    subprocess.Popen(
+        [sys.executable, '-c',
+         'from enhanced_ema_webapp import check_and_update_data_on_startup; check_and_update_data_on_startup()'],
+        cwd=chdir
+    )
+    server.log.info("Started startup data check")
 
 def worker_exit(server, worker):
     """Called when a worker is exited."""
@@ -1,9 +1,14 @@
 import os
 import time
 import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 from datetime import datetime, timedelta
+from io import StringIO
 import logging
 from tqdm import tqdm
 
@@ -33,10 +38,37 @@ HEADERS = {
 RATE_LIMIT_DELAY = 5  # seconds between requests
 MAX_RETRIES = 3
 SESSION_REFRESH_INTERVAL = 10  # refresh session after every 10 requests
+DOWNLOAD_WORKERS = 4  # date ranges downloaded in parallel per company
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Guards the shared session and request counter across download threads
+session_lock = threading.Lock()
+
+class RateLimiter:
+    """Lets one request through per interval across all threads"""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self.semaphore = threading.BoundedSemaphore(1)
+        
+        # Background timer hands out a new permit every interval
+        self.timer = threading.Thread(target=self._refill, daemon=True)
+        self.timer.start()
+    
+    def _refill(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.semaphore.release()
+            except ValueError:
+                pass  # A permit is already waiting
+    
+    def acquire(self):
+        """Block until the next request may be sent"""
+        self.semaphore.acquire()
+
 def read_companies():
     """Read company symbols from CSV file"""
     try:
@@ -82,6 +114,12 @@ def get_session():
     session = requests.Session()
     session.headers.update(HEADERS)
     
+    # Pooled keep-alive connections; failed requests are retried with exponential backoff
+    retry = Retry(total=MAX_RETRIES, backoff_factor=2,
+                  status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry)
+    session.mount('https://', adapter)
+    
     # Visit the main NSE website to get necessary cookies
     try:
         logging.info("Initializing new NSE session...")
@@ -96,7 +134,10 @@ def get_session():
         logging.error(f"Error initializing session: {e}")
         return None
 
-def download_data(session, symbol, start_date, end_date, retry_count=0):
+class SessionRejected(Exception):
+    """NSE refused the session's cookies - a fresh session is needed before retrying"""
+
+def download_data(session, symbol, start_date, end_date):
     """Download data for a given symbol and date range using the provided session"""
     params = {
         'symbol': symbol,
@@ -114,88 +155,65 @@ def download_data(session, symbol, start_date, end_date, retry_count=0):
         symbol_response = session.get(symbol_url)
         time.sleep(1)  # Small delay after accessing the symbol page
         
-        # Now download the CSV data
+        # Now download the CSV data - 429/5xx are retried by the session adapter
         response = session.get(HISTORICAL_API_URL, params=params)
         
-        if response.status_code == 200:
-            # Check if response is CSV data
-            if response.text.strip().startswith("Date,") or "," in response.text:
-                return response.text
-            else:
-                logging.warning(f"Received non-CSV response for {symbol}: {response.text[:100]}...")
-                if retry_count < MAX_RETRIES:
-                    logging.info(f"Retrying {symbol} ({retry_count+1}/{MAX_RETRIES})...")
-                    time.sleep(RATE_LIMIT_DELAY * 2)  # Extra delay before retry
-                    
-                    if retry_count == MAX_RETRIES - 1:
-                        # On last retry, get a fresh session
-                        session = get_session()
-                    
-                    return download_data(session, symbol, start_date, end_date, retry_count + 1)
-                else:
-                    logging.error(f"Max retries reached for {symbol}")
-                    return None
-        else:
+        if response.status_code in (401, 403):
+            raise SessionRejected(f"HTTP {response.status_code}")
+        
+        if response.status_code != 200:
             logging.warning(f"Failed to download {symbol}: HTTP {response.status_code}")
-            if retry_count < MAX_RETRIES:
-                logging.info(f"Retrying {symbol} ({retry_count+1}/{MAX_RETRIES})...")
-                time.sleep(RATE_LIMIT_DELAY * 2)  # Extra delay before retry
-                
-                if retry_count == MAX_RETRIES - 1:
-                    # On last retry, get a fresh session
-                    session = get_session()
-                
-                return download_data(session, symbol, start_date, end_date, retry_count + 1)
-            else:
-                logging.error(f"Max retries reached for {symbol}")
-                return None
+            return None
+        
+        # Check if response is CSV data - anything else is NSE's block page for stale cookies
+        if response.text.strip().startswith("Date,") or "," in response.text:
+            return response.text
+        
+        raise SessionRejected(f"non-CSV response: {response.text[:100]}...")
+    except SessionRejected:
+        raise
     except Exception as e:
         logging.error(f"Error downloading {symbol}: {e}")
-        if retry_count < MAX_RETRIES:
-            logging.info(f"Retrying {symbol} ({retry_count+1}/{MAX_RETRIES})...")
-            time.sleep(RATE_LIMIT_DELAY * 2)
-            
-            if retry_count == MAX_RETRIES - 1:
-                # On last retry, get a fresh session
-                session = get_session()
-            
-            return download_data(session, symbol, start_date, end_date, retry_count + 1)
         return None
 
-def save_temp_data(symbol, date_range, data):
-    """Save temporary data file"""
-    if not data:
-        return None
-    
-    start_date, end_date = date_range
-    filename = os.path.join(OUTPUT_DIR, f"{symbol}_{start_date}_{end_date}.csv")
-    
-    try:
-        with open(filename, 'w', newline='') as f:
-            f.write(data)
-        return filename
-    except Exception as e:
-        logging.error(f"Error saving temporary file for {symbol}: {e}")
-        return None
+def next_session(state, rejected=None):
+    """Count a request and return the shared session, refreshing it periodically or when it was rejected"""
+    with session_lock:
+        state['request_count'] += 1
+        stale = rejected is not None and state['session'] is rejected
+        if stale or state['request_count'] % SESSION_REFRESH_INTERVAL == 0:
+            logging.info("Refreshing session...")
+            session = get_session()
+            if not session:
+                session = get_session()  # Try one more time
+                if not session:
+                    logging.error("Failed to refresh session. Continuing with existing session.")
+                    session = requests.Session()
+                    session.headers.update(HEADERS)
+            state['session'] = session
+            time.sleep(RATE_LIMIT_DELAY)  # Wait after refreshing session
+        return state['session']
 
-def merge_files(symbol, temp_files):
-    """Merge all temporary files for a symbol into one CSV"""
-    if not temp_files:
-        logging.warning(f"No data files to merge for {symbol}")
-        return
-    
-    all_data = []
-    header = None
+def download_range(state, rate_limiter, symbol, date_range):
+    """Download one date range for a symbol - runs on a download worker thread"""
+    start_date, end_date = date_range
+    session = next_session(state)
     
-    # Read all temporary files
-    for file in temp_files:
-        if file and os.path.exists(file):
-            try:
-                df = pd.read_csv(file)
-                all_data.append(df)
-            except Exception as e:
-                logging.error(f"Error reading {file}: {e}")
+    for attempt in range(1, MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            return download_data(session, symbol, start_date, end_date)
+        except SessionRejected as e:
+            logging.warning(f"Session rejected for {symbol} ({e}), attempt {attempt}/{MAX_RETRIES}")
+            if attempt < MAX_RETRIES:
+                # Unless another worker already replaced it, swap the rejected session for a fresh one
+                session = next_session(state, rejected=session)
     
+    logging.error(f"Max retries reached for {symbol}")
+    return None
+
+def merge_files(symbol, all_data):
+    """Merge all downloaded ranges for a symbol into one CSV"""
     if not all_data:
         logging.warning(f"No valid data found for {symbol}")
         return
@@ -203,22 +221,20 @@ def merge_files(symbol, temp_files):
     # Concatenate all dataframes
     try:
         merged_data = pd.concat(all_data, ignore_index=True)
-        # Remove duplicates if any
-        merged_data = merged_data.drop_duplicates()
-        # Sort by date
         if 'Date' in merged_data.columns:
-            merged_data['Date'] = pd.to_datetime(merged_data['Date'])
-            merged_data = merged_data.sort_values('Date')
+            # Ranges only overlap at year boundaries, so duplicates are repeated dates
+            merged_data['Date'] = pd.to_datetime(merged_data['Date'], errors='coerce')
+            merged_data.drop_duplicates(subset='Date', inplace=True)
+            # Sort by date
+            merged_data.sort_values('Date', inplace=True, ignore_index=True)
+        else:
+            # Remove duplicates if any
+            merged_data.drop_duplicates(inplace=True)
         
         # Save merged file
         output_file = os.path.join(OUTPUT_DIR, f"{symbol}_15yr_data.csv")
         merged_data.to_csv(output_file, index=False)
         logging.info(f"Successfully created merged file for {symbol}: {output_file}")
-        
-        # Clean up temporary files
-        for file in temp_files:
-            if file and os.path.exists(file):
-                os.remove(file)
     except Exception as e:
         logging.error(f"Error merging data for {symbol}: {e}")
 
@@ -240,45 +256,36 @@ def main():
         logging.error("Failed to initialize session. Exiting.")
         return
     
-    # Track requests to refresh session periodically
-    request_count = 0
+    # Shared session and request count, refreshed periodically under session_lock
+    state = {'session': session, 'request_count': 0}
+    rate_limiter = RateLimiter(RATE_LIMIT_DELAY)
     
     # Process each company
     for company_idx, symbol in enumerate(tqdm(companies, desc="Processing companies")):
         logging.info(f"Processing {symbol} ({company_idx+1}/{len(companies)})")
-        temp_files = []
+        frames = []
         
-        # Download data for each date range
-        for range_idx, date_range in enumerate(tqdm(date_ranges, desc=f"Downloading {symbol}", leave=False)):
-            # Check if we need to refresh the session
-            request_count += 1
-            if request_count % SESSION_REFRESH_INTERVAL == 0:
-                logging.info("Refreshing session...")
-                session = get_session()
-                if not session:
-                    session = get_session()  # Try one more time
-                    if not session:
-                        logging.error("Failed to refresh session. Continuing with existing session.")
-                        session = requests.Session()
-                        session.headers.update(HEADERS)
-                time.sleep(RATE_LIMIT_DELAY)  # Wait after refreshing session
-            
+        # Download all date ranges in parallel - the rate limiter keeps requests spaced out
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = [executor.submit(download_range, state, rate_limiter, symbol, date_range)
+                       for date_range in date_ranges]
+            results = [future.result() for future in tqdm(futures, desc=f"Downloading {symbol}", leave=False)]
+        
+        for date_range, data in zip(date_ranges, results):
             start_date, end_date = date_range
-            data = download_data(session, symbol, start_date, end_date)
             
             if data:
-                temp_file = save_temp_data(symbol, date_range, data)
-                if temp_file:
-                    temp_files.append(temp_file)
-                    logging.info(f"Saved data for {symbol} ({start_date} to {end_date})")
+                # Parse the CSV text in memory - no temporary files
+                try:
+                    frames.append(pd.read_csv(StringIO(data)))
+                    logging.info(f"Downloaded data for {symbol} ({start_date} to {end_date})")
+                except Exception as e:
+                    logging.error(f"Error parsing data for {symbol} ({start_date} to {end_date}): {e}")
             else:
                 logging.warning(f"No data for {symbol} ({start_date} to {end_date})")
-            
-            # Rate limiting
-            time.sleep(RATE_LIMIT_DELAY)
         
-        # Merge all files for this company
-        merge_files(symbol, temp_files)
+        # Merge all ranges for this company
+        merge_files(symbol, frames)
         
         # Additional delay between companies
         time.sleep(2)
@@ -12,6 +12,7 @@ Usage:
 
 import os
 import sys
+import threading
 from pathlib import Path
 
 # Add the current directory to Python path
@@ -20,7 +21,7 @@ sys.path.insert(0, str(current_dir))
 
 # Import the Flask application
 try:
-    from enhanced_ema_webapp import app as application
+    from enhanced_ema_webapp import app as application, check_and_update_data_on_startup
     
     # Set production environment
     os.environ['FLASK_ENV'] = 'production'
@@ -33,5 +34,7 @@ except ImportError as e:
     raise
 
 if __name__ == "__main__":
-    # This allows running the WSGI file directly for testing
+    # This allows running the WSGI file directly for testing; Gunicorn runs the
+    # startup check from when_ready in gunicorn_config.py, so start it here instead
+    threading.Thread(target=check_and_update_data_on_startup, daemon=True).start()
     application.run(host='0.0.0.0', port=5000, debug=False) 
\ No newline at end of file